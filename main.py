@@ -1,16 +1,28 @@
+import json
 import math
+import os
+import pickle
+import uuid
 from enum import Enum
 from functools import partial
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import pyarrow
+import pyarrow.csv
 import streamlit as st
 
 # Constants for directory names and data file
 TAGGED_DANCE_DIR = "tagged-dances"
 UNTAGGED_DANCE_DIR = "untagged-dances"
 DATA_FILE = "data.csv"
+# Compacted data including all corrections; the CSV is only written on export.
+PARQUET_DATA_FILE = "data.parquet"
+# Corrections saved since the last compaction, one JSON object per line.
+CORRECTIONS_FILE = "corrections.jsonl"
+# Last scan of both video directories, reused while neither of them changed.
+VIDEOS_FILE = "videos.pkl"
 
 
 class TagStatus(Enum):
@@ -26,7 +38,43 @@ class DanceType(Enum):
     other = "other"
 
 
+# The label columns only take a handful of values, so they are stored as
+# categoricals. This keeps them small and makes comparisons cheap.
+TAG_STATUS_DTYPE = pd.CategoricalDtype(TagStatus._member_names_)
+DANCE_TYPE_DTYPE = pd.CategoricalDtype(DanceType._member_names_)
+
+DATA_DTYPES = {
+    "day_dance_id": "string",
+    "waggle_id": "string",
+    "category": "Int64",
+    "category_label": TAG_STATUS_DTYPE,
+    "corrected_category": "Int64",
+    "corrected_category_label": TAG_STATUS_DTYPE,
+    "dance_type": DANCE_TYPE_DTYPE,
+    "corrected_dance_type": DANCE_TYPE_DTYPE,
+}
+
+# Columns whose type must not be inferred when reading the CSV with pyarrow.
+CSV_COLUMN_TYPES = {
+    "day_dance_id": pyarrow.string(),
+    "waggle_id": pyarrow.string(),
+    "confidence": pyarrow.float64(),
+}
+
+# Columns that are written by on_save and recorded in CORRECTIONS_FILE.
+CORRECTION_COLUMNS = [
+    "corrected_category",
+    "corrected_category_label",
+    "corrected_dance_type",
+]
+
+# Columns read by show_videos, in this order.
+PAGE_COLUMNS = ["day_dance_id", "corrected_category_label"]
+
 OPTION_MAP = {0: TagStatus.tagged.name, 1: TagStatus.untagged.name}
+# Options of the dance type radio buttons, computed once instead of per video.
+DANCE_TYPE_NAMES = tuple(DanceType._member_names_)
+DANCE_TYPE_INDEX = {name: i for i, name in enumerate(DANCE_TYPE_NAMES)}
 
 
 def show_settings():
@@ -58,15 +106,229 @@ def show_settings():
             on_change=reload_videos,
             horizontal=True,
         )
+        st.button(
+            "Export CSV",
+            disabled=st.session_state["store_key"] is None,
+            on_click=export_csv,
+        )
+        st.button(
+            "Compact",
+            help=f"Merges {CORRECTIONS_FILE} into {PARQUET_DATA_FILE}.",
+            disabled=st.session_state["store_key"] is None,
+            on_click=compact_data,
+        )
+
+
+def _data_path(directory: Path) -> Path:
+    """Prefers the Parquet file written by compact_data, and falls back to the
+    CSV for directories that haven't been labeled yet."""
+    data_path = directory / PARQUET_DATA_FILE
+    return data_path if data_path.exists() else directory / DATA_FILE
+
+
+def _check_categories(df: pd.DataFrame, path: Path):
+    """Raises ValueError if a label column of df contains values that are not
+    among its categories, which astype would silently turn into missing
+    values."""
+    for column, dtype in DATA_DTYPES.items():
+        if column not in df or not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        values = df[column]
+        unknown = values[values.notna() & ~values.isin(dtype.categories)].unique()
+        if len(unknown):
+            raise ValueError(
+                f"Unknown values in column {column} of {path.name}: "
+                + ", ".join(map(str, unknown))
+            )
+
+
+def _load_data(path: Path) -> pd.DataFrame:
+    """Parses the Parquet or CSV data."""
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+        _check_categories(df, path)
+        return df.astype(DATA_DTYPES)
+    # pyarrow's multi-threaded CSV reader is considerably faster than pandas'
+    # default engine. pandas' own engine="pyarrow" infers types before
+    # applying dtype, which would turn "0001" into "1", so the reader is
+    # called directly with the types that must not be inferred.
+    table = pyarrow.csv.read_csv(
+        path,
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types=CSV_COLUMN_TYPES, strings_can_be_null=True
+        ),
+    )
+    df = table.to_pandas()
+    _check_categories(df, path)
+    return df.astype(DATA_DTYPES)
+
+
+def _mp4_map(dirpath: Path) -> dict[str, str]:
+    """Maps the stem of every MP4 file in dirpath to its path."""
+    # os.scandir avoids the per-entry overhead of Path.glob.
+    with os.scandir(dirpath) as entries:
+        return {
+            entry.name[:-4]: entry.path
+            for entry in entries
+            if entry.name.endswith(".mp4")
+        }
+
+
+def _video_dir_mtimes(directory: Path) -> tuple[float, float]:
+    """Returns the modification times of both video directories."""
+    return (
+        (directory / TAGGED_DANCE_DIR).stat().st_mtime,
+        (directory / UNTAGGED_DANCE_DIR).stat().st_mtime,
+    )
+
+
+def _save_videos_map(
+    directory: Path, videos: dict[str, str], mtimes: tuple[float, float]
+):
+    """Writes videos to the VIDEOS_FILE of directory, replacing the previous
+    one only once it is complete."""
+    tmp_path = directory / (VIDEOS_FILE + ".tmp")
+    with open(tmp_path, "wb") as videos_file:
+        pickle.dump({"mtimes": mtimes, "videos": videos}, videos_file)
+    os.replace(tmp_path, directory / VIDEOS_FILE)
+
+
+def _videos_map(directory: Path) -> dict[str, str]:
+    """Maps each day_dance_id to its video path, reusing the scan saved in
+    VIDEOS_FILE if neither video directory has changed since."""
+    mtimes = _video_dir_mtimes(directory)
+    try:
+        with open(directory / VIDEOS_FILE, "rb") as videos_file:
+            saved = pickle.load(videos_file)
+        if saved["mtimes"] == mtimes:
+            return saved["videos"]
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError):
+        # A missing or damaged file just means scanning again.
+        pass
+    # The mtimes from before the scan are saved, so that a video added while
+    # scanning still triggers a new scan next time.
+    videos = {
+        **_mp4_map(directory / TAGGED_DANCE_DIR),
+        **_mp4_map(directory / UNTAGGED_DANCE_DIR),
+    }
+    _save_videos_map(directory, videos, mtimes)
+    return videos
+
+
+def _correction_records(df: pd.DataFrame, day_dance_ids: list[str]) -> list[dict]:
+    """Returns the corrections of the given rows as JSON serializable dicts."""
+    values = df.loc[day_dance_ids, CORRECTION_COLUMNS].astype(object)
+    values = values.where(values.notna(), None)
+    return [
+        {"day_dance_id": d_id, **dict(zip(CORRECTION_COLUMNS, row))}
+        for d_id, row in zip(day_dance_ids, values.itertuples(index=False))
+    ]
+
+
+def _apply_corrections(df: pd.DataFrame, corrections_path: Path) -> list[str]:
+    """Applies the corrections logged in corrections_path to df in place and
+    returns warnings about log entries that couldn't be applied."""
+    warnings = []
+    with open(corrections_path, "r+b") as corrections_file:
+        content = corrections_file.read()
+        # An append that was interrupted, e.g. by the server being killed
+        # mid-save, leaves an incomplete last line behind. It is cut off so
+        # that the next save starts on a fresh line.
+        complete_end = content.rfind(b"\n") + 1
+        if complete_end < len(content):
+            corrections_file.truncate(complete_end)
+            warnings.append(f"Discarded an incomplete last line in {CORRECTIONS_FILE}.")
+    records = []
+    for line_number, line in enumerate(content[:complete_end].splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            warnings.append(
+                f"Skipped unreadable line {line_number} in {CORRECTIONS_FILE}."
+            )
+    if not records:
+        return warnings
+    # Only the latest correction of each video counts.
+    patch = (
+        pd.DataFrame.from_records(
+            records, columns=["day_dance_id"] + CORRECTION_COLUMNS
+        )
+        .drop_duplicates("day_dance_id", keep="last")
+        .set_index("day_dance_id")
+    )
+    _check_categories(patch, corrections_path)
+    patch = patch.astype({c: DATA_DTYPES[c] for c in CORRECTION_COLUMNS})
+    unknown = ~patch.index.isin(df.index)
+    if unknown.any():
+        warnings.append(
+            f"Skipped corrections in {CORRECTIONS_FILE} for unknown videos: "
+            + ", ".join(patch.index[unknown])
+        )
+        patch = patch[~unknown]
+    for column in CORRECTION_COLUMNS:
+        df.loc[patch.index, column] = patch[column].array
+    return warnings
+
+
+def _data_mtimes(root_dir: Path) -> tuple[float, float]:
+    """Returns the modification times of the data file and the corrections log."""
+    corrections_path = root_dir / CORRECTIONS_FILE
+    return (
+        _data_path(root_dir).stat().st_mtime,
+        corrections_path.stat().st_mtime if corrections_path.exists() else 0.0,
+    )
+
+
+def _read_store(root_dir: Path) -> dict:
+    """Reads the data and videos of root_dir from disk."""
+    df = _load_data(_data_path(root_dir))
+    # Index by day_dance_id (keeping the column) so that rows can be looked up
+    # and updated directly instead of scanning the whole column with a mask.
+    df.set_index("day_dance_id", drop=False, inplace=True)
+    corrections_path = root_dir / CORRECTIONS_FILE
+    warnings = (
+        _apply_corrections(df, corrections_path) if corrections_path.exists() else []
+    )
+    return {
+        "df": df,
+        # day_dance_id -> video file path. Paths are kept as strings and only
+        # turned into Path objects when needed.
+        "videos": _videos_map(root_dir),
+        # Identifies the contents of df, see _filter_rows.
+        "version": uuid.uuid4().hex,
+        # Problems found while loading, shown by load_directory.
+        "warnings": warnings,
+        # Modification times of the files df was read from, updated whenever
+        # the app writes them itself. load_directory compares them to tell
+        # changes made outside of the app.
+        "mtimes": _data_mtimes(root_dir),
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _data_store(directory: str) -> dict:
+    """Loads the data and videos of directory once per process. Unlike
+    st.cache_data, the store is shared instead of copied on every access, so
+    corrections are made to it in place."""
+    return _read_store(Path(directory))
+
+
+def _store() -> dict | None:
+    """Returns the data store of the loaded directory, if any."""
+    if st.session_state["store_key"] is None:
+        return None
+    return _data_store(st.session_state["store_key"])
 
 
 def load_directory():
     """Called when the user clicks Load after entering the directory."""
     directory = Path(st.session_state["directory"])
-    data_path = directory / DATA_FILE
+    data_path = _data_path(directory)
 
     if not data_path.exists():
-        st.warning(f"Could not find {DATA_FILE} in {directory}")
+        st.warning(f"Could not find {PARQUET_DATA_FILE} or {DATA_FILE} in {directory}")
         return
 
     # Check if subdirectories exist
@@ -78,26 +340,19 @@ def load_directory():
         )
         return
 
-    # Save video file paths (day_dance_id -> video file Path) into session state
-    st.session_state["videos"] = {
-        v.stem: v
-        for v in list(tagged_dir.glob("*.mp4")) + list(untagged_dir.glob("*.mp4"))
-    }
-
-    # Load the CSV data into session state
-    st.session_state["data_df"] = pd.read_csv(
-        data_path,
-        dtype={
-            "day_dance_id": "string",
-            "waggle_id": "string",
-            "category": "Int64",
-            "category_label": "string",
-            "corrected_category": "Int64",
-            "corrected_category_label": "string",
-            "dance_type": "string",
-            "corrected_dance_type": "string",
-        },
-    )
+    try:
+        store = _data_store(str(directory))
+        # Read the directory again if its files were changed outside of the app.
+        if store["mtimes"] != _data_mtimes(directory):
+            store.update(_read_store(directory))
+    except ValueError as e:
+        st.warning(f"Could not load {directory}: {e}")
+        return
+    # Only the key of the data store is kept in session state.
+    st.session_state["store_key"] = str(directory)
+    for warning in store["warnings"]:
+        st.warning(warning)
+    df = store["df"]
 
     # Reset pagination state and checkmarks
     st.session_state["current_page"] = 1
@@ -105,38 +360,47 @@ def load_directory():
 
     # Init dance_types
     # This is necessary because we need to remember these values even if the current page changes.
-    df = st.session_state["data_df"]
-    for _, row in df.iterrows():
-        day_dance_id = row["day_dance_id"]
-        corrected_dance_type = row["corrected_dance_type"]
-        dance_type = row["dance_type"]
-        st.session_state["dance_types"][day_dance_id] = (
-            corrected_dance_type if not pd.isna(corrected_dance_type) else dance_type
-        )
+    corrected_dance_types = df["corrected_dance_type"]
+    merged_dance_types = corrected_dance_types.where(
+        corrected_dance_types.notna(), df["dance_type"]
+    )
+    st.session_state["dance_types"] = dict(
+        zip(df["day_dance_id"].to_numpy(), merged_dance_types.to_numpy())
+    )
 
     reload_videos()
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def _filter_rows(_df: pd.DataFrame, data_version: str, selected_label: str):
+    """Returns the positions of the rows to show for the selected label. The
+    DataFrame itself isn't hashed; data_version identifies its contents."""
+    # Show if the original label equals selection and not yet corrected,
+    # or if the corrected label equals the selection. Both columns share
+    # TAG_STATUS_DTYPE, so this compares the integer codes directly
+    # (-1 for missing values).
+    label_codes = _df["category_label"].cat.codes.to_numpy()
+    corrected_codes = _df["corrected_category_label"].cat.codes.to_numpy()
+    selected_code = TAG_STATUS_DTYPE.categories.get_loc(selected_label)
+    mask = ((label_codes == selected_code) & (corrected_codes == -1)) | (
+        corrected_codes == selected_code
+    )
+    return np.flatnonzero(mask)
+
+
 def reload_videos():
     """Filters the CSV data for the selected category and stores the rows to show."""
-    if "data_df" not in st.session_state:
+    store = _store()
+    if store is None:
         return  # Nothing loaded yet
 
     selected_label = OPTION_MAP[
         st.session_state["category_selection"]
     ]  # "tagged" or "untagged"
-    df = st.session_state["data_df"]
-
-    # Filter rows: show if the original label equals selection and not yet corrected,
-    # or if the corrected label equals the selection.
-    rows_in_category = df.loc[
-        (
-            (df["category_label"] == selected_label)
-            & (df["corrected_category_label"].isnull())
-        )
-        | (df["corrected_category_label"] == selected_label)
-    ]
-    st.session_state["rows_to_show"] = rows_in_category
+    # Only the row positions are stored; pages are looked up in the store.
+    st.session_state["rows_to_show"] = _filter_rows(
+        store["df"], store["version"], selected_label
+    )
 
     # Reset the pagination and checkmarks whenever the category changes.
     st.session_state["current_page"] = 1
@@ -149,14 +413,15 @@ def show_videos():
         return
 
     rows_to_show = st.session_state["rows_to_show"]
-    if rows_to_show.empty:
+    if rows_to_show.size == 0:
         st.write("No videos found for this category.")
         return
 
+    store = _store()
     rows = st.session_state["rows"]
     cols = st.session_state["cols"]
     page_size = rows * cols
-    total_videos = rows_to_show.shape[0]
+    total_videos = rows_to_show.size
     total_pages = math.ceil(total_videos / page_size)
 
     st.markdown(f"**Total videos:** {total_videos} | **Pages:** {total_pages}")
@@ -168,7 +433,11 @@ def show_videos():
         # Calculate the subset of rows for this page
         start_idx = (current_page - 1) * page_size
         end_idx = min(current_page * page_size, total_videos)
-        page_df = rows_to_show.iloc[start_idx:end_idx]
+        # Only the columns needed to render the page are taken from the data.
+        df = store["df"]
+        page_df = df.iloc[
+            rows_to_show[start_idx:end_idx], df.columns.get_indexer(PAGE_COLUMNS)
+        ]
         page_total = page_df.shape[0]
         n_grid_rows = math.ceil(page_total / cols)
         for r in range(n_grid_rows):
@@ -177,17 +446,17 @@ def show_videos():
                 idx = r * cols + c
                 if idx >= page_total:
                     break
-                # Get the day_dance_id (assumed to be the first column)
+                # Get the day_dance_id (the first column of PAGE_COLUMNS)
                 day_dance_id = page_df.iat[idx, 0]
                 with cols_container[c]:
-                    # "corrected_category_label" is assumed to be the seventh column
-                    if pd.isna(page_df.iat[idx, 6]):
+                    # "corrected_category_label" is the second column of PAGE_COLUMNS
+                    if pd.isna(page_df.iat[idx, 1]):
                         st.write(day_dance_id)
                     else:
                         st.write(f"{day_dance_id} - corrected")
-                    vid_path = st.session_state.get("videos", {}).get(day_dance_id)
+                    vid_path = store["videos"].get(day_dance_id)
                     if vid_path:
-                        st.video(str(vid_path), loop=True, autoplay=True)
+                        st.video(vid_path, loop=True, autoplay=True)
                     else:
                         st.write("No video found")
                     st.checkbox(
@@ -202,13 +471,11 @@ def show_videos():
                     dance_type = st.session_state["dance_types"][day_dance_id]
                     st.radio(
                         "Dance Type",
-                        options=DanceType._member_names_,
-                        # format_func=lambda option: DanceType[option]
-                        # .name[0]
-                        # .capitalize(),
-                        format_func=lambda option: DanceType[option].name.capitalize(),
+                        options=DANCE_TYPE_NAMES,
+                        # DanceType member names are their own values.
+                        format_func=str.capitalize,
                         key=f"{day_dance_id}_dance_type",
-                        index=DanceType._member_names_.index(dance_type),
+                        index=DANCE_TYPE_INDEX[dance_type],
                         horizontal=True,
                     )
 
@@ -237,16 +504,18 @@ def on_save(page, mode):
     cols = st.session_state["cols"]
     page_size = rows * cols
     rows_to_show = st.session_state["rows_to_show"]
-    total_videos = rows_to_show.shape[0]
+    total_videos = rows_to_show.size
     total_pages = math.ceil(total_videos / page_size)
     current_page = st.session_state.get("current_page", 1)
 
     # Determine the rows corresponding to this page.
     start_idx = (page - 1) * page_size
     end_idx = min(page * page_size, total_videos)
-    page_df = rows_to_show.iloc[start_idx:end_idx]
-
-    current_day_dance_ids = page_df["day_dance_id"].tolist()
+    store = _store()
+    df = store["df"]
+    current_day_dance_ids = (
+        df["day_dance_id"].iloc[rows_to_show[start_idx:end_idx]].tolist()
+    )
 
     # Update dance types
     # This is necessary because st.session_state[f"{d_id}_dance_type"] only
@@ -255,10 +524,10 @@ def on_save(page, mode):
     for d_id in current_day_dance_ids:
         st.session_state["dance_types"][d_id] = st.session_state[f"{d_id}_dance_type"]
 
-    # Update the CSV (stored in session_state["data_df"]) with corrections and
-    # move videos into appropriate directories.
-    root_dir = Path(st.session_state["directory"])
-    df = st.session_state["data_df"]
+    # Update the data store with corrections and move videos into
+    # appropriate directories. The directory is the one the store was loaded
+    # from, which the directory input may no longer show.
+    root_dir = Path(st.session_state["store_key"])
 
     current_checkmarked = {
         d_id for d_id in current_day_dance_ids if st.session_state.get(d_id, False)
@@ -275,47 +544,67 @@ def on_save(page, mode):
     # and discarded when the next page is loaded.
     st.session_state["checkmarked_per_page"][current_page] = current_checkmarked.copy()
 
+    # Work out all category swaps and video moves before df is touched, so
+    # that df is either updated and logged completely or not at all.
+    swapped_ids = []
+    corrected_categories = []
+    corrected_labels = []
+    moves = []
     for d_id in current_day_dance_ids:
-        dance_type = st.session_state[f"{d_id}_dance_type"]
-        if dance_type == DanceType.waggle.name:
-            df.loc[df["day_dance_id"] == d_id, "corrected_dance_type"] = np.nan
-        else:
-            df.loc[df["day_dance_id"] == d_id, "corrected_dance_type"] = dance_type
         if d_id in swap_category_ids:
-            corrected_category = df.loc[
-                df["day_dance_id"] == d_id, "corrected_category"
-            ].values[0]
-            current_label = df.loc[df["day_dance_id"] == d_id, "category_label"].values[
-                0
-            ]
+            corrected_category = df.at[d_id, "corrected_category"]
+            current_label = df.at[d_id, "category_label"]
             if pd.isna(corrected_category):
                 new_category, new_label, dance_dir = (
                     (0, TagStatus.tagged.name, TAGGED_DANCE_DIR)
                     if current_label == TagStatus.untagged.name
                     else (1, TagStatus.untagged.name, UNTAGGED_DANCE_DIR)
                 )
-                df.loc[df["day_dance_id"] == d_id, "corrected_category"] = new_category
-                df.loc[df["day_dance_id"] == d_id, "corrected_category_label"] = (
-                    new_label
-                )
             else:
-                df.loc[df["day_dance_id"] == d_id, "corrected_category"] = np.nan
-                df.loc[df["day_dance_id"] == d_id, "corrected_category_label"] = np.nan
+                new_category, new_label = pd.NA, pd.NA
                 dance_dir = (
                     TAGGED_DANCE_DIR
                     if current_label == TagStatus.tagged.name
                     else UNTAGGED_DANCE_DIR
                 )
-            source = st.session_state["videos"][d_id]
-            destination = root_dir.joinpath(dance_dir, source.name)
-            print(f"{d_id} to {destination}")
-            move_file(source, destination)
-            st.session_state["videos"][d_id] = destination
-    st.session_state["data_df"] = df
-
-    # Save the CSV back to disk.
-    data_path = root_dir / DATA_FILE
-    df.to_csv(data_path, index=False)
+            swapped_ids.append(d_id)
+            corrected_categories.append(new_category)
+            corrected_labels.append(new_label)
+            # Videos without a file ("No video found") have nothing to move.
+            if d_id in store["videos"]:
+                source = Path(store["videos"][d_id])
+                destination = root_dir.joinpath(dance_dir, source.name)
+                moves.append((d_id, source, destination))
+
+    # Waggle is the default dance type, so it is stored as "no correction".
+    df.loc[current_day_dance_ids, "corrected_dance_type"] = [
+        np.nan if dance_type == DanceType.waggle.name else dance_type
+        for dance_type in (
+            st.session_state[f"{d_id}_dance_type"] for d_id in current_day_dance_ids
+        )
+    ]
+    if swapped_ids:
+        df.loc[swapped_ids, "corrected_category"] = corrected_categories
+        df.loc[swapped_ids, "corrected_category_label"] = corrected_labels
+    store["version"] = uuid.uuid4().hex
+
+    # Append the corrections of every row on the page to the log instead of
+    # rewriting the whole data file. Logging the whole page, not only the rows
+    # that changed, means the log never depends on what df held before. The
+    # log is merged into the data file by compact_data.
+    with open(root_dir / CORRECTIONS_FILE, "a") as corrections_file:
+        for record in _correction_records(df, current_day_dance_ids):
+            corrections_file.write(json.dumps(record) + "\n")
+    store["mtimes"] = _data_mtimes(root_dir)
+
+    # Move the videos only once the corrections are on disk.
+    for d_id, source, destination in moves:
+        print(f"{d_id} to {destination}")
+        move_file(source, destination)
+        store["videos"][d_id] = str(destination)
+    if moves:
+        # Keep VIDEOS_FILE valid for the next load instead of scanning again.
+        _save_videos_map(root_dir, store["videos"], _video_dir_mtimes(root_dir))
     st.success(f"Saved corrections for page {page}.")
 
     # If more pages exist, increment or decrement current_page.
@@ -325,9 +614,32 @@ def on_save(page, mode):
         st.session_state["current_page"] = current_page - 1
 
 
+def export_csv():
+    """Writes the current data, including all corrections, to the CSV file."""
+    root_dir = Path(st.session_state["store_key"])
+    store = _store()
+    store["df"].to_csv(root_dir / DATA_FILE, index=False)
+    store["mtimes"] = _data_mtimes(root_dir)
+    st.success(f"Exported corrections to {DATA_FILE}.")
+
+
+def compact_data():
+    """Writes the current data to the Parquet file and clears the corrections log."""
+    root_dir = Path(st.session_state["store_key"])
+    store = _store()
+    store["df"].to_parquet(root_dir / PARQUET_DATA_FILE, index=False)
+    (root_dir / CORRECTIONS_FILE).unlink(missing_ok=True)
+    store["mtimes"] = _data_mtimes(root_dir)
+    st.success(f"Merged corrections into {PARQUET_DATA_FILE}.")
+
+
 def move_file(source, destination):
-    if not destination.exists():
-        source.replace(destination)
+    # A plain rename, without checking for the destination first. Both video
+    # directories live in the same directory, so the rename is atomic.
+    try:
+        os.rename(source, destination)
+    except FileExistsError:
+        pass
 
 
 def main():
@@ -336,12 +648,10 @@ def main():
     # Initialize session state variables if they don't exist
     if "directory" not in st.session_state:
         st.session_state["directory"] = None
-    if "data_df" not in st.session_state:
-        st.session_state["data_df"] = None
+    if "store_key" not in st.session_state:
+        st.session_state["store_key"] = None
     if "rows_to_show" not in st.session_state:
-        st.session_state["rows_to_show"] = pd.DataFrame()
-    if "videos" not in st.session_state:
-        st.session_state["videos"] = []
+        st.session_state["rows_to_show"] = np.array([], dtype=int)
     if "current_page" not in st.session_state:
         st.session_state["current_page"] = 1
     # if "checkmarked_ids" not in st.session_state:
@@ -1,10 +1,11 @@
 import argparse
-import csv
 import json
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from zipfile import ZipFile
 
+import pandas as pd
 from ffmpeg import FFmpeg
 from tqdm import tqdm
 
@@ -30,7 +31,10 @@ def main() -> None:
         if daily_target.exists():
             print(f"{daily_target} already exists.")
             continue
-        with ZipFile(zip_path) as zip_file:
+        # A single scratch directory per zip file holds the APNG that is
+        # currently being encoded, because ffmpeg's APNG demuxer needs a
+        # seekable input and can't read the video from a pipe.
+        with ZipFile(zip_path) as zip_file, tempfile.TemporaryDirectory() as tmp_dir:
             day_dance_ids = []
             waggle_ids = []
             dance_types = []
@@ -43,49 +47,72 @@ def main() -> None:
             video_filenames = list(
                 filter(lambda filename: filename.endswith(".apng"), zip_file.namelist())
             )
-            count = 1
-            for video_filename in tqdm(video_filenames):
-                # Find matching metadata file
-                metadata_filename = video_filename.replace("frames.apng", "waggle.json")
-                with zip_file.open(metadata_filename) as metadata_file:
-                    json_data = json.load(metadata_file)
-                # We only care about waggles, so filter the rest out.
-                if json_data["predicted_class_label"] != "waggle":
-                    continue
+            # Read all metadata files in a single pass up front. We only care
+            # about waggles, so the rest are filtered out before encoding.
+            metadata = {
+                video_filename: json.loads(
+                    zip_file.read(video_filename.replace("frames.apng", "waggle.json"))
+                )
+                for video_filename in video_filenames
+            }
+            waggle_filenames = [
+                video_filename
+                for video_filename in video_filenames
+                if metadata[video_filename]["predicted_class_label"] == "waggle"
+            ]
+
+            jobs = []
+            for count, video_filename in enumerate(waggle_filenames, start=1):
+                json_data = metadata[video_filename]
                 day_dance_id = f"{count:04d}"
                 day_dance_ids.append(day_dance_id)
                 waggle_ids.append(json_data["waggle_id"])
                 dance_types.append(json_data["predicted_class_label"])
-                with tempfile.TemporaryDirectory() as tmp_dir:
-                    # Files within the zip file are named like this:
-                    # "12/44/8/frames.apng". This gives us a nested directory
-                    # structure. We want a flat structure instead. Therefore,
-                    # we assign a new name to the filename attribute of the
-                    # video file which doesn't contain slashes and uniquely
-                    # identifies the file.
-                    # For example, "12/44/8/frames.apng" is renamed to "0001.apng".
-                    zip_file.getinfo(video_filename).filename = day_dance_id + ".apng"
-                    zip_file.extract(video_filename, tmp_dir)
-                    input = Path(tmp_dir) / (day_dance_id + ".apng")
-                    output = untagged_target_dir / (day_dance_id + ".mp4")
-                    encode_video(input, output)
-                count += 1
+                output = untagged_target_dir / (day_dance_id + ".mp4")
+                jobs.append((video_filename, day_dance_id, tmp_dir, output))
+
+            # Encoding is CPU-bound and independent per video, so spread it
+            # across all cores. Each worker opens the zip file once.
+            with ProcessPoolExecutor(
+                initializer=init_worker, initargs=(zip_path,)
+            ) as executor:
+                list(tqdm(executor.map(encode_member, jobs), total=len(jobs)))
 
+            # Scalars are broadcast to every row by pandas.
             data = {
                 "day_dance_id": day_dance_ids,
                 "waggle_id": waggle_ids,
-                "category": len(day_dance_ids) * [TagStatus.untagged.value],
-                "category_label": len(day_dance_ids) * [TagStatus.untagged.name],
-                "confidence": len(day_dance_ids) * [""],
-                "corrected_category": len(day_dance_ids) * [""],
-                "corrected_category_label": len(day_dance_ids) * [""],
+                "category": TagStatus.untagged.value,
+                "category_label": TagStatus.untagged.name,
+                "confidence": "",
+                "corrected_category": "",
+                "corrected_category_label": "",
                 "dance_type": dance_types,
-                "corrected_dance_type": len(day_dance_ids) * [""],
+                "corrected_dance_type": "",
             }
-            with open(daily_target / DATA_FILE, "w") as csv_file:
-                writer = csv.writer(csv_file)
-                writer.writerow(data.keys())
-                writer.writerows(zip(*data.values()))
+            pd.DataFrame(data).to_csv(daily_target / DATA_FILE, index=False)
+
+
+# The zip file opened by init_worker in each worker process.
+worker_zip_file = None
+
+
+def init_worker(zip_path: Path):
+    global worker_zip_file
+    worker_zip_file = ZipFile(zip_path)
+
+
+def encode_member(job: tuple[str, str, str, Path]):
+    """Extracts a single video from the worker's zip file and encodes it."""
+    video_filename, day_dance_id, tmp_dir, output = job
+    # Files within the zip file are named like this:
+    # "12/44/8/frames.apng". We want a flat structure instead, so the video
+    # is written under a name that uniquely identifies it.
+    # For example, "12/44/8/frames.apng" is written to "0001.apng".
+    input = Path(tmp_dir) / (day_dance_id + ".apng")
+    input.write_bytes(worker_zip_file.read(video_filename))
+    encode_video(input, output)
+    input.unlink()
 
 
 def init_argparse() -> argparse.ArgumentParser:
@@ -113,7 +140,14 @@ def encode_video(input: Path, output: Path):
         FFmpeg()
         .option("y")
         .input(str(input))
-        .output(str(output), {"codec:v": "libx264"}, crf=18, pix_fmt="yuv420p")
+        .output(
+            str(output),
+            {"codec:v": "libx264"},
+            crf=18,
+            pix_fmt="yuv420p",
+            # Videos are encoded in parallel, one per worker process.
+            threads=1,
+        )
     )
     ffmpeg.execute()
 